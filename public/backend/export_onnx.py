@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Export the trained scaler + classifier to ONNX
+Run offline whenever the .pkl files change; main.py serves the .onnx
+file through onnxruntime when it is present
+
+Requires: pip install skl2onnx onnxruntime
+"""
+
+import os
+import json
+import joblib
+import numpy as np
+import onnx
+from sklearn.pipeline import make_pipeline
+from skl2onnx import convert_sklearn
+from skl2onnx.common.data_types import FloatTensorType
+
+from main import expected_feature_count, file_sha256
+
+def main():
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    model_dir = os.path.join(script_dir, "model")
+
+    model_path = os.path.join(model_dir, "cough_classifier_model.pkl")
+    scaler_path = os.path.join(model_dir, "feature_scaler.pkl")
+    model = joblib.load(model_path)
+    scaler = joblib.load(scaler_path)
+    with open(os.path.join(model_dir, "model_config.json"), 'r') as f:
+        config = json.load(f)
+
+    # Fold the scaler into the graph so inference is a single session run
+    pipeline = make_pipeline(scaler, model)
+    n_features = expected_feature_count(config)
+    if scaler.n_features_in_ != n_features:
+        raise SystemExit(
+            f"✗ Scaler expects {scaler.n_features_in_} features but model_config.json "
+            f"(features_v2={config.get('features_v2', False)}) produces {n_features}"
+        )
+    onx = convert_sklearn(
+        pipeline,
+        initial_types=[('X', FloatTensorType([None, n_features]))],
+        # Plain probability tensor instead of a list of {class: prob} maps
+        options={id(model): {'zipmap': False}},
+        target_opset={'': 17, 'ai.onnx.ml': 3}
+    )
+
+    # Recorded so main.py can tell when the export is stale
+    onnx.helper.set_model_props(onx, {
+        "model_sha256": file_sha256(model_path),
+        "scaler_sha256": file_sha256(scaler_path),
+        "feature_count": str(n_features),
+    })
+
+    onnx_path = os.path.join(model_dir, "cough_classifier_model.onnx")
+    with open(onnx_path, 'wb') as f:
+        f.write(onx.SerializeToString())
+    print(f"✓ ONNX model written to: {onnx_path}")
+
+    # Sanity check against the sklearn pipeline
+    import onnxruntime
+    sess = onnxruntime.InferenceSession(onnx_path, providers=['CPUExecutionProvider'])
+    X = np.random.default_rng(0).normal(scaler.mean_, scaler.scale_, size=(256, n_features)).astype(np.float32)
+    onnx_proba = sess.run(['probabilities'], {'X': X})[0]
+    sklearn_proba = pipeline.predict_proba(X)
+    print(f"✓ Max probability difference vs sklearn: {np.abs(onnx_proba - sklearn_proba).max():.2e}")
+
+if __name__ == "__main__":
+    main()
@@ -5,20 +5,51 @@ Provides an API endpoint for real-time cough prediction (dry vs wet)
 """
 
 import os
+import asyncio
+import functools
 import warnings
 warnings.filterwarnings('ignore')
 
-from fastapi import FastAPI, HTTPException
+# One BLAS/OpenMP thread per process: requests are already spread across
+# the extraction pool's processes, and per-process BLAS thread pools on top
+# of that would oversubscribe the CPUs. Must be set before numpy is imported.
+for _var in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'NUMEXPR_NUM_THREADS'):
+    os.environ.setdefault(_var, '1')
+
+# Persist numba's compiled librosa kernels next to the service so restarts
+# reuse them; must be set before librosa (and numba) is imported
+os.environ.setdefault('NUMBA_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.numba_cache'))
+
+from fastapi import FastAPI, File, HTTPException, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import librosa
 import numpy as np
+import scipy.fft
 import joblib
 import json
-import base64
-import tempfile
+import io
+import threading
+import hashlib
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import av
+import soundfile as sf
 from typing import Optional
 
+# onnxruntime is optional: without it predictions go through sklearn
+try:
+    import onnxruntime
+except ImportError:
+    onnxruntime = None
+
+# xxhash is optional: without it audio is keyed with hashlib's blake2b
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Cough Classification API",
@@ -39,10 +70,43 @@ app.add_middleware(
 model = None
 scaler = None
 config = None
+onnx_session = None  # scaler + model exported by export_onnx.py, if available
+
+# Length of the feature vector the scaler and model were trained on:
+# 13 MFCCs x 4 stats + 8 spectral features x 4 stats + tempo
+FEATURE_DIM = 85
+
+# Reduced feature set used when model_config.json sets "features_v2": the
+# tonnetz stats and tempo are dropped, since tonnetz runs a full
+# constant-Q transform and beat tracking a dynamic program, both costly
+# and of little use on a short non-musical clip. Requires a model and
+# scaler retrained on the 80-dimensional vector.
+FEATURE_DIM_V2 = 80
+
+def expected_feature_count(config):
+    """Feature vector width implied by model_config.json's features_v2 flag"""
+    return FEATURE_DIM_V2 if config.get('features_v2', False) else FEATURE_DIM
+
+# STFT / mel / MFCC parameters (librosa defaults, as used in training)
+N_FFT = 2048
+HOP_LENGTH = 512
+N_MELS = 128
+N_MFCC = 13
 
-# Request model
-class PredictionRequest(BaseModel):
-    audio: str  # Base64-encoded audio data
+# Concurrent predictions are gathered for up to BATCH_WINDOW_S seconds
+# (at most MAX_BATCH_SIZE of them) and scored with one scaler/model call
+MAX_BATCH_SIZE = 32
+BATCH_WINDOW_S = 0.005
+# Upper bound on how long a request waits for its batch to be scored
+PREDICT_TIMEOUT_S = 30.0
+
+# Number of feature vectors kept, keyed by a hash of the uploaded audio, so
+# re-submitted recordings and client retries skip feature extraction
+FEATURE_CACHE_SIZE = 1024
+_feature_cache = OrderedDict()
+
+# Per-thread scratch space reused across requests (see extract_audio_features_from_array)
+_tls = threading.local()
 
 # Response model
 class PredictionResponse(BaseModel):
@@ -50,9 +114,47 @@ class PredictionResponse(BaseModel):
     confidence_score: float  # 0-100
     message: Optional[str] = None
 
+def file_sha256(path):
+    """Hex SHA-256 of a file, used to tie the ONNX export to its source pickles"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _load_onnx_session(onnx_path, model_path, scaler_path, n_features):
+    """
+    Open the ONNX export, or return None if it no longer matches the pickles
+    export_onnx.py records the pickles' hashes and the feature count in the
+    model metadata; a retrained model or a changed feature set without a
+    fresh export falls back to sklearn rather than serving the stale graph
+    """
+    sess_options = onnxruntime.SessionOptions()
+    sess_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    sess_options.intra_op_num_threads = 1
+    session = onnxruntime.InferenceSession(onnx_path, sess_options, providers=['CPUExecutionProvider'])
+    
+    metadata = session.get_modelmeta().custom_metadata_map
+    expected = {
+        "model_sha256": file_sha256(model_path),
+        "scaler_sha256": file_sha256(scaler_path),
+        "feature_count": str(n_features),
+    }
+    mismatched = [key for key, value in expected.items() if metadata.get(key) != value]
+    if session.get_inputs()[0].shape[1] != n_features:
+        mismatched.append("input width")
+    
+    if mismatched:
+        print(f"WARNING: {onnx_path} is out of date ({', '.join(mismatched)} differ); "
+              f"using sklearn. Rerun export_onnx.py to refresh it.")
+        return None
+    
+    print(f"✓ ONNX model loaded from: {onnx_path}")
+    return session
+
 def load_models():
     """Load trained model, scaler, and configuration"""
-    global model, scaler, config
+    global model, scaler, config, onnx_session
     
     # Use relative path from the script location
     script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -67,6 +169,10 @@ def load_models():
         model_path = os.path.join(model_dir, "cough_classifier_model.pkl")
         print(f"Looking for model at: {model_path}")
         model = joblib.load(model_path)
+        # The forest was trained with n_jobs=-1; predicting a small batch
+        # doesn't benefit from a thread per core
+        if hasattr(model, 'n_jobs'):
+            model.n_jobs = 1
         print(f"✓ Model loaded from: {model_path}")
         
         # Load scaler
@@ -80,108 +186,334 @@ def load_models():
             config = json.load(f)
         print(f"✓ Configuration loaded from: {config_path}")
         
+        # The extractor's output width follows features_v2; it has to match
+        # what the scaler (and so the model) was fitted on
+        n_features = expected_feature_count(config)
+        if scaler.n_features_in_ != n_features:
+            raise ValueError(
+                f"Scaler expects {scaler.n_features_in_} features but model_config.json "
+                f"(features_v2={config.get('features_v2', False)}) produces {n_features}. "
+                f"Set features_v2 to match the model files."
+            )
+        
+        # Load ONNX export of scaler + model, if present and up to date
+        onnx_path = os.path.join(model_dir, "cough_classifier_model.onnx")
+        if onnxruntime is not None and os.path.exists(onnx_path):
+            onnx_session = _load_onnx_session(onnx_path, model_path, scaler_path, n_features)
+        
         return True
     except Exception as e:
         print(f"✗ Error loading models: {e}")
         import traceback
         traceback.print_exc()
+        # A partially loaded or mismatched set must not serve predictions
+        model = scaler = config = onnx_session = None
         return False
 
-def extract_audio_features(audio_path, target_duration=5.0, sr=22050):
+def _stats4(x, axis=None):
+    """
+    Return (mean, std, min, max) of x stacked along a new leading axis.
+    The mean is reused for the std instead of being recomputed.
+    """
+    mean = x.mean(axis=axis, keepdims=True)
+    std = np.sqrt(np.mean(np.square(x - mean), axis=axis))
+    return np.stack([np.squeeze(mean, axis=axis), std, x.min(axis=axis), x.max(axis=axis)])
+
+@functools.lru_cache(maxsize=None)
+def _filter_banks(sr):
+    """
+    Mel filterbank and DCT-II matrix for the MFCC pipeline at sample rate sr
+    Built once per sample rate instead of on every melspectrogram/mfcc call
+    """
+    mel_basis = librosa.filters.mel(sr=sr, n_fft=N_FFT, n_mels=N_MELS)
+    dct_basis = scipy.fft.dct(np.eye(N_MELS, dtype=np.float32), type=2, norm='ortho', axis=0)[:N_MFCC]
+    return mel_basis, dct_basis
+
+def _spectrograms(audio, sr):
+    """
+    Magnitude and power STFT, log-mel spectrogram and MFCCs of audio
+    Matches librosa.stft / melspectrogram / power_to_db / mfcc using the
+    cached filter banks
+    """
+    mel_basis, dct_basis = _filter_banks(sr)
+    S = np.abs(librosa.stft(audio, n_fft=N_FFT, hop_length=HOP_LENGTH))
+    S_power = S ** 2
+    log_mel = 10.0 * np.log10(np.maximum(mel_basis @ S_power, 1e-10))
+    np.maximum(log_mel, log_mel.max() - 80.0, out=log_mel)
+    mfcc = dct_basis @ log_mel
+    return S, S_power, log_mel, mfcc
+
+def _decode_with_av(buf, target_duration):
+    """
+    Decode a compressed container (e.g. webm/opus from the browser) with PyAV
+    Returns the waveform at its native rate and that rate
+    """
+    chunks = []
+    sr_in = None
+    n = 0
+    with av.open(buf) as container:
+        stream = container.streams.audio[0]
+        resampler = av.AudioResampler(format='fltp')
+        for frame in container.decode(stream):
+            for out in resampler.resample(frame):
+                if sr_in is None:
+                    sr_in = out.sample_rate
+                # (channels, samples) -> mono
+                chunk = out.to_ndarray().mean(axis=0)
+                chunks.append(chunk)
+                n += len(chunk)
+            if sr_in is not None and n >= int(target_duration * sr_in):
+                break
+    
+    if sr_in is None:
+        raise ValueError("No audio frames could be decoded")
+    
+    audio = np.concatenate(chunks)[:int(target_duration * sr_in)]
+    return audio.astype(np.float32, copy=False), sr_in
+
+def decode_audio(audio_data, target_duration=5.0, sr=22050):
     """
-    Extract audio features from a cough recording
-    Same as training script
+    Decode raw audio bytes in memory to a mono waveform at sr
+    Reads at most target_duration seconds, like librosa.load(duration=...)
     """
+    buf = io.BytesIO(audio_data)
     try:
-        # Load audio file
-        audio, sample_rate = librosa.load(audio_path, sr=sr, duration=target_duration, res_type='kaiser_fast')
-        
-        # Pad or trim to fixed duration
-        target_length = int(target_duration * sr)
-        if len(audio) < target_length:
-            audio = np.pad(audio, (0, target_length - len(audio)), mode='constant')
-        else:
-            audio = audio[:target_length]
-        
-        features = []
-        
-        # 1. MFCC features (13 coefficients)
-        mfcc = librosa.feature.mfcc(y=audio, sr=sr, n_mfcc=13)
-        mfcc_mean = np.mean(mfcc, axis=1).tolist()
-        mfcc_std = np.std(mfcc, axis=1).tolist()
-        mfcc_min = np.min(mfcc, axis=1).tolist()
-        mfcc_max = np.max(mfcc, axis=1).tolist()
-        features.extend(mfcc_mean)
-        features.extend(mfcc_std)
-        features.extend(mfcc_min)
-        features.extend(mfcc_max)
-        
-        # 2. Spectral Centroid
-        spectral_centroid = librosa.feature.spectral_centroid(y=audio, sr=sr)
-        features.append(float(np.mean(spectral_centroid)))
-        features.append(float(np.std(spectral_centroid)))
-        features.append(float(np.min(spectral_centroid)))
-        features.append(float(np.max(spectral_centroid)))
-        
-        # 3. Spectral Bandwidth
-        spectral_bandwidth = librosa.feature.spectral_bandwidth(y=audio, sr=sr)
-        features.append(float(np.mean(spectral_bandwidth)))
-        features.append(float(np.std(spectral_bandwidth)))
-        features.append(float(np.min(spectral_bandwidth)))
-        features.append(float(np.max(spectral_bandwidth)))
-        
-        # 4. Spectral Rolloff
-        spectral_rolloff = librosa.feature.spectral_rolloff(y=audio, sr=sr)
-        features.append(float(np.mean(spectral_rolloff)))
-        features.append(float(np.std(spectral_rolloff)))
-        features.append(float(np.min(spectral_rolloff)))
-        features.append(float(np.max(spectral_rolloff)))
-        
-        # 5. Zero Crossing Rate
-        zcr = librosa.feature.zero_crossing_rate(audio)
-        features.append(float(np.mean(zcr)))
-        features.append(float(np.std(zcr)))
-        features.append(float(np.min(zcr)))
-        features.append(float(np.max(zcr)))
-        
-        # 6. Chroma Features
-        chroma = librosa.feature.chroma_stft(y=audio, sr=sr)
-        features.append(float(np.mean(chroma)))
-        features.append(float(np.std(chroma)))
-        features.append(float(np.min(chroma)))
-        features.append(float(np.max(chroma)))
-        
-        # 7. Spectral Contrast
-        spectral_contrast = librosa.feature.spectral_contrast(y=audio, sr=sr)
-        features.append(float(np.mean(spectral_contrast)))
-        features.append(float(np.std(spectral_contrast)))
-        features.append(float(np.min(spectral_contrast)))
-        features.append(float(np.max(spectral_contrast)))
-        
-        # 8. Tonnetz (Tonal Centroid Features)
-        tonnetz = librosa.feature.tonnetz(y=audio, sr=sr)
-        features.append(float(np.mean(tonnetz)))
-        features.append(float(np.std(tonnetz)))
-        features.append(float(np.min(tonnetz)))
-        features.append(float(np.max(tonnetz)))
-        
-        # 9. RMS Energy
-        rms = librosa.feature.rms(y=audio)
-        features.append(float(np.mean(rms)))
-        features.append(float(np.std(rms)))
-        features.append(float(np.min(rms)))
-        features.append(float(np.max(rms)))
-        
-        # 10. Tempo
-        tempo, _ = librosa.beat.beat_track(y=audio, sr=sr)
-        features.append(float(tempo))
-        
-        return np.array(features)
+        with sf.SoundFile(buf) as f:
+            sr_in = f.samplerate
+            audio = f.read(frames=int(target_duration * sr_in), dtype='float32', always_2d=True)
+        audio = audio.mean(axis=1)
+    except RuntimeError:
+        # Not a format libsndfile understands - fall back to ffmpeg via PyAV
+        buf.seek(0)
+        audio, sr_in = _decode_with_av(buf, target_duration)
+    
+    if sr_in != sr:
+        audio = librosa.resample(audio, orig_sr=sr_in, target_sr=sr, res_type='soxr_hq')
     
+    return audio
+
+def extract_audio_features_from_bytes(audio_data, target_duration=5.0, sr=22050, features_v2=False):
+    """
+    Decode audio bytes and extract features
+    Returns None if the audio cannot be decoded or processed
+    """
+    try:
+        audio = decode_audio(audio_data, target_duration=target_duration, sr=sr)
+        return extract_audio_features_from_array(audio, target_duration=target_duration, sr=sr,
+                                                 features_v2=features_v2)
     except Exception as e:
         print(f"Error extracting features: {e}")
         return None
 
+def extract_audio_features_from_array(audio, target_duration=5.0, sr=22050, features_v2=False):
+    """
+    Extract audio features from a decoded cough recording
+    Same as training script; features_v2 selects the reduced 80-feature set
+    """
+    # Pad or trim to fixed duration, reusing this thread's audio buffer
+    # rather than allocating a fresh padded copy for every request
+    target_length = int(target_duration * sr)
+    buf = getattr(_tls, 'audio_buf', None)
+    if buf is None or buf.shape[0] != target_length:
+        buf = _tls.audio_buf = np.zeros(target_length, dtype=np.float32)
+        _tls.audio_len = 0
+    n = min(len(audio), target_length)
+    np.copyto(buf[:n], audio[:n])
+    # Everything past the previous clip's length is still zero, so only
+    # the part of it this clip doesn't overwrite needs clearing
+    buf[n:_tls.audio_len] = 0.0
+    _tls.audio_len = n
+    audio = buf
+    
+    # Compute the STFT once and derive every spectral feature from it.
+    # Centroid, bandwidth, rolloff and contrast use the magnitude
+    # spectrogram; chroma and the mel spectrogram use power, matching
+    # what librosa computes internally when given the waveform.
+    # 1. MFCC features (13 coefficients, stats per coefficient) come from
+    # the same pass: mel projection, power_to_db (ref=1, top_db=80) and an
+    # orthonormal DCT-II, as librosa.feature.mfcc does
+    S, S_power, log_mel, mfcc = _spectrograms(audio, sr)
+    
+    # 2-4. Spectral Centroid, Bandwidth, Rolloff
+    spectral_centroid = librosa.feature.spectral_centroid(S=S, sr=sr)
+    spectral_bandwidth = librosa.feature.spectral_bandwidth(S=S, sr=sr)
+    spectral_rolloff = librosa.feature.spectral_rolloff(S=S, sr=sr)
+    
+    # 5. Zero Crossing Rate
+    zcr = librosa.feature.zero_crossing_rate(audio)
+    
+    # 6. Chroma Features
+    chroma = librosa.feature.chroma_stft(S=S_power, sr=sr)
+    
+    # 7. Spectral Contrast
+    spectral_contrast = librosa.feature.spectral_contrast(S=S, sr=sr)
+    
+    # 8. Tonnetz (Tonal Centroid Features) - not part of the reduced set
+    tonnetz = None if features_v2 else librosa.feature.tonnetz(y=audio, sr=sr)
+    
+    # 9. RMS Energy
+    rms = librosa.feature.rms(y=audio)
+    
+    # MFCC stats are laid out as 13 means, 13 stds, 13 mins, 13 maxes;
+    # every other feature contributes (mean, std, min, max) over the
+    # whole matrix.
+    spectral_features = [spectral_centroid, spectral_bandwidth, spectral_rolloff,
+                         zcr, chroma, spectral_contrast, tonnetz, rms]
+    features = np.empty(FEATURE_DIM_V2 if features_v2 else FEATURE_DIM, dtype=np.float32)
+    features[:52] = _stats4(mfcc, axis=1).ravel()
+    i = 52
+    for feature in spectral_features:
+        if feature is None:
+            continue
+        features[i:i + 4] = _stats4(feature)
+        i += 4
+    
+    if not features_v2:
+        # 10. Tempo (not part of the reduced set) - the onset envelope is
+        # computed from the same log-mel spectrogram beat_track would
+        # otherwise rebuild from the waveform
+        onset_env = librosa.onset.onset_strength(S=log_mel, sr=sr, aggregate=np.median)
+        tempo, _ = librosa.beat.beat_track(onset_envelope=onset_env, sr=sr)
+        features[i] = np.asarray(tempo).item()
+    
+    return features
+
+def _audio_cache_key(audio_data, features_v2):
+    """Content hash of the uploaded audio, qualified by the feature set"""
+    if xxhash is not None:
+        digest = xxhash.xxh3_128_digest(audio_data)
+    else:
+        digest = hashlib.blake2b(audio_data, digest_size=16).digest()
+    return (digest, features_v2)
+
+def _cache_get(key):
+    """Return cached features for key (marking them recently used), or None"""
+    features = _feature_cache.get(key)
+    if features is not None:
+        _feature_cache.move_to_end(key)
+    return features
+
+def _cache_put(key, features):
+    """Store features under key, evicting the least recently used entry if full"""
+    features.flags.writeable = False
+    _feature_cache[key] = features
+    _feature_cache.move_to_end(key)
+    if len(_feature_cache) > FEATURE_CACHE_SIZE:
+        _feature_cache.popitem(last=False)
+
+def _warm_up_worker(features_v2):
+    """
+    Extraction pool initializer: run the pipeline once on silence so numba
+    JIT compilation and librosa's lazy imports happen before the first request
+    """
+    try:
+        extract_audio_features_from_array(np.zeros(int(5.0 * 22050), dtype=np.float32),
+                                          features_v2=features_v2)
+    except Exception as e:
+        print(f"WARNING: Feature extraction warm-up failed: {e}")
+
+def _worker_ready():
+    """No-op task used to wait for the extraction workers to start"""
+    return True
+
+def _available_cpus():
+    """Cores this process may run on, which honours container CPU sets"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def _extraction_pool_size():
+    """
+    Number of extraction workers for this process; with several uvicorn
+    workers (WEB_CONCURRENCY) the cores are split between their pools
+    """
+    return max(1, _available_cpus() // int(os.environ.get('WEB_CONCURRENCY', 1)))
+
+def _new_extraction_pool(features_v2):
+    """Create the feature extraction pool; each worker warms up as it starts"""
+    return ProcessPoolExecutor(max_workers=_extraction_pool_size(), initializer=_warm_up_worker,
+                               initargs=(features_v2,))
+
+def _pool_is_broken(pool):
+    """True once a worker of pool has died (the executor sets _broken then)"""
+    return pool is None or bool(getattr(pool, '_broken', False))
+
+async def _extract_in_pool(audio_data, features_v2):
+    """
+    Extract features in the process pool
+    A worker killed mid-request (OOM, native crash) breaks the whole pool, so
+    it is replaced and the request retried once before giving up with a 503
+    """
+    loop = asyncio.get_running_loop()
+    for _ in range(2):
+        pool = app.state.pool
+        try:
+            return await loop.run_in_executor(
+                pool,
+                functools.partial(extract_audio_features_from_bytes, audio_data, features_v2=features_v2)
+            )
+        except BrokenProcessPool:
+            print("WARNING: Feature extraction worker died; starting a new pool")
+            # Concurrent requests may all hit the same broken pool; only the
+            # first one to get here replaces it
+            if app.state.pool is pool:
+                pool.shutdown(wait=False, cancel_futures=True)
+                app.state.pool = _new_extraction_pool(features_v2)
+    
+    raise HTTPException(status_code=503, detail="Feature extraction worker crashed. Please retry.")
+
+def _predict_proba_batch(features_batch):
+    """Scale a (batch, n_features) matrix and return class probabilities per row"""
+    # C-contiguous float32 is what both onnxruntime and sklearn's tree
+    # predictor work on, so neither has to make its own converted copy
+    features_batch = np.ascontiguousarray(features_batch, dtype=np.float32)
+    
+    if onnx_session is not None:
+        # The ONNX graph includes the scaler
+        return onnx_session.run(['probabilities'], {'X': features_batch})[0]
+    
+    features_scaled = scaler.transform(features_batch)
+    if features_scaled.dtype != np.float32 or not features_scaled.flags.c_contiguous:
+        features_scaled = np.ascontiguousarray(features_scaled, dtype=np.float32)
+    return model.predict_proba(features_scaled)
+
+async def _batch_predictions(queue):
+    """
+    Background task serving queued (features, future) pairs in batches
+    Waits for one request, gives concurrent ones BATCH_WINDOW_S to join it,
+    then runs a single prediction for the whole batch off the event loop
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await queue.get()]
+        await asyncio.sleep(BATCH_WINDOW_S)
+        while len(batch) < MAX_BATCH_SIZE and not queue.empty():
+            batch.append(queue.get_nowait())
+
+        # Any failure is handed to the waiting requests rather than ending the task
+        try:
+            features_batch = np.stack([features for features, _ in batch])
+            probabilities = await loop.run_in_executor(None, _predict_proba_batch, features_batch)
+            for (_, future), proba in zip(batch, probabilities):
+                if not future.done():
+                    future.set_result(proba)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+def _start_batcher():
+    """Start the prediction batcher, restarting it if it ever exits unexpectedly"""
+    def restart(task):
+        if task.cancelled():
+            return
+        print(f"WARNING: Prediction batcher stopped ({task.exception()!r}); restarting it")
+        _start_batcher()
+
+    app.state.batcher = asyncio.create_task(_batch_predictions(app.state.predict_queue))
+    app.state.batcher.add_done_callback(restart)
+
 @app.on_event("startup")
 async def startup_event():
     """Load models on startup"""
@@ -191,8 +523,32 @@ async def startup_event():
     success = load_models()
     if not success:
         print("WARNING: Models not loaded. Service will not function correctly.")
+    
+    # Feature extraction is CPU-bound and would block the event loop, so it
+    # runs in worker processes. They are forked from this process and so
+    # start with librosa already imported, then warm up before serving.
+    features_v2 = config.get('features_v2', False) if config is not None else False
+    n_workers = _extraction_pool_size()
+    app.state.pool = _new_extraction_pool(features_v2)
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(*(loop.run_in_executor(app.state.pool, _worker_ready) for _ in range(n_workers)))
+    print(f"✓ Feature extraction pool started with {n_workers} workers")
+    
+    # Warm the prediction path as well
+    if success:
+        _predict_proba_batch(np.zeros((1, FEATURE_DIM_V2 if features_v2 else FEATURE_DIM), dtype=np.float32))
+        print("✓ Prediction path warmed up")
+    
+    app.state.predict_queue = asyncio.Queue()
+    _start_batcher()
     print("="*60)
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the prediction batcher and the feature extraction pool"""
+    app.state.batcher.cancel()
+    app.state.pool.shutdown(wait=False, cancel_futures=True)
+
 @app.get("/")
 async def root():
     """Health check endpoint"""
@@ -206,11 +562,13 @@ async def root():
 @app.get("/health")
 async def health():
     """Detailed health check"""
+    pool_ok = not _pool_is_broken(getattr(app.state, 'pool', None))
     return {
-        "status": "healthy" if model is not None else "unhealthy",
+        "status": "healthy" if model is not None and pool_ok else "unhealthy",
         "model_loaded": model is not None,
         "scaler_loaded": scaler is not None,
-        "config_loaded": config is not None
+        "config_loaded": config is not None,
+        "extraction_pool_ok": pool_ok
     }
 
 @app.get("/model-status")
@@ -222,6 +580,7 @@ async def model_status():
     model_path = os.path.join(model_dir, "cough_classifier_model.pkl")
     scaler_path = os.path.join(model_dir, "feature_scaler.pkl")
     config_path = os.path.join(model_dir, "model_config.json")
+    onnx_path = os.path.join(model_dir, "cough_classifier_model.onnx")
     
     return {
         "script_dir": script_dir,
@@ -230,20 +589,22 @@ async def model_status():
         "model_file_exists": os.path.exists(model_path),
         "scaler_file_exists": os.path.exists(scaler_path),
         "config_file_exists": os.path.exists(config_path),
+        "onnx_file_exists": os.path.exists(onnx_path),
         "model_loaded_in_memory": model is not None,
         "scaler_loaded_in_memory": scaler is not None,
         "config_loaded_in_memory": config is not None,
+        "onnx_session_loaded": onnx_session is not None,
         "files_in_model_dir": os.listdir(model_dir) if os.path.exists(model_dir) else [],
         "files_in_script_dir": os.listdir(script_dir)
     }
 
 @app.post("/predict", response_model=PredictionResponse)
-async def predict_cough(request: PredictionRequest):
+async def predict_cough(audio: UploadFile = File(...)):
     """
-    Predict cough type from base64-encoded audio
+    Predict cough type from an uploaded audio file
     
     Args:
-        request: PredictionRequest with base64-encoded audio
+        audio: multipart/form-data file field with the raw audio bytes
         
     Returns:
         PredictionResponse with predicted_cough_type and confidence_score
@@ -252,54 +613,50 @@ async def predict_cough(request: PredictionRequest):
         raise HTTPException(status_code=503, detail="ML model not loaded. Check /model-status endpoint.")
     
     try:
-        # Decode base64 audio
-        print(f"Received audio data length: {len(request.audio)} characters")
-        audio_data = base64.b64decode(request.audio)
-        print(f"Decoded audio size: {len(audio_data)} bytes")
-        
-        # Save to temporary file - try multiple formats
-        # Browser typically sends webm, but we'll try to handle it
-        with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_file:
-            temp_file.write(audio_data)
-            temp_path = temp_file.name
+        audio_data = await audio.read()
+        print(f"Received audio file: {audio.filename}, {len(audio_data)} bytes")
         
-        print(f"Saved audio to: {temp_path}")
+        loop = asyncio.get_running_loop()
+        features_v2 = config.get('features_v2', False)
+        cache_key = _audio_cache_key(audio_data, features_v2)
+        features = _cache_get(cache_key)
         
-        try:
-            # Extract features
+        if features is not None:
+            print("Using cached audio features")
+        else:
+            # Extract features straight from the uploaded bytes in a worker process
             print("Extracting audio features...")
-            features = extract_audio_features(temp_path)
+            features = await _extract_in_pool(audio_data, features_v2)
             
             if features is None:
                 raise HTTPException(status_code=400, detail="Failed to extract audio features. The audio format may not be supported.")
             
             print(f"Extracted {len(features)} features")
-            
-            # Reshape and scale features
-            features_scaled = scaler.transform(features.reshape(1, -1))
-            print("Features scaled successfully")
-            
-            # Make prediction
-            prediction = model.predict(features_scaled)[0]
-            prediction_proba = model.predict_proba(features_scaled)[0]
-            print(f"Prediction: {prediction}, Probabilities: {prediction_proba}")
-            
-            # Get predicted class and confidence
-            cough_type = config['label_mapping'][str(prediction)]
-            confidence = float(prediction_proba[prediction] * 100)  # Convert to percentage
-            
-            print(f"Result: {cough_type} with {confidence}% confidence")
-            
-            return PredictionResponse(
-                predicted_cough_type=cough_type,
-                confidence_score=round(confidence, 2),
-                message="Prediction completed successfully"
-            )
+            _cache_put(cache_key, features)
+        
+        # Queue the features for the next prediction batch
+        future = loop.create_future()
+        await app.state.predict_queue.put((features, future))
+        try:
+            prediction_proba = await asyncio.wait_for(future, PREDICT_TIMEOUT_S)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=503, detail="Prediction timed out. Please try again.")
+        
+        class_index = int(np.argmax(prediction_proba))
+        prediction = model.classes_[class_index]
+        print(f"Prediction: {prediction}, Probabilities: {prediction_proba}")
         
-        finally:
-            # Clean up temporary file
-            if os.path.exists(temp_path):
-                os.unlink(temp_path)
+        # Get predicted class and confidence
+        cough_type = config['label_mapping'][str(prediction)]
+        confidence = float(prediction_proba[class_index] * 100)  # Convert to percentage
+        
+        print(f"Result: {cough_type} with {confidence}% confidence")
+        
+        return PredictionResponse(
+            predicted_cough_type=cough_type,
+            confidence_score=round(confidence, 2),
+            message="Prediction completed successfully"
+        )
     
     except HTTPException:
         raise
@@ -313,10 +670,18 @@ async def predict_cough(request: PredictionRequest):
 if __name__ == "__main__":
     import uvicorn
     
-    print("Starting FastAPI server...")
+    # One uvicorn worker per core by default; exported so each worker can
+    # size its feature extraction pool to match
+    workers = int(os.environ.setdefault('WEB_CONCURRENCY', str(_available_cpus())))
+    
+    print(f"Starting FastAPI server with {workers} workers...")
     uvicorn.run(
-        app,
+        "main:app",
+        app_dir=os.path.dirname(os.path.abspath(__file__)),
         host="0.0.0.0",
         port=8000,
-        log_level="info"
+        loop="uvloop",
+        http="httptools",
+        workers=workers,
+        log_level="warning"
     )
@@ -15,23 +15,6 @@ export interface ApiError {
   detail: string;
 }
 
-/**
- * Convert audio blob to base64 string
- */
-async function blobToBase64(blob: Blob): Promise<string> {
-  return new Promise((resolve, reject) => {
-    const reader = new FileReader();
-    reader.onloadend = () => {
-      const base64 = reader.result as string;
-      // Remove the data URL prefix (e.g., "data:audio/webm;base64,")
-      const base64Data = base64.split(',')[1];
-      resolve(base64Data);
-    };
-    reader.onerror = reject;
-    reader.readAsDataURL(blob);
-  });
-}
-
 /**
  * Send audio file to backend for classification
  */
@@ -47,7 +30,8 @@ export async function classifyCough(audioBlob: Blob): Promise<PredictionResponse
   const { blob: processedBlob, converted } = await convertToWav(audioBlob);
   console.log(`Audio ${converted ? 'converted to WAV' : 'kept in original format'}, size:`, processedBlob.size);
 
-  const base64Audio = await blobToBase64(processedBlob);
+  const formData = new FormData();
+  formData.append('audio', processedBlob, converted ? 'recording.wav' : 'recording');
 
   console.log('API_BASE_URL:', API_BASE_URL);
   console.log('Sending request to:', `${API_BASE_URL}/predict`);
@@ -55,10 +39,8 @@ export async function classifyCough(audioBlob: Blob): Promise<PredictionResponse
   try {
     const response = await fetch(`${API_BASE_URL}/predict`, {
       method: 'POST',
-      headers: {
-        'Content-Type': 'application/json',
-      },
-      body: JSON.stringify({ audio: base64Audio }),
+      // Let the browser set the multipart/form-data boundary
+      body: formData,
     });
 
     const responseText = await response.text();